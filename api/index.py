@@ -1,30 +1,138 @@
+import asyncio
+import gzip
+import hashlib
+import mimetypes
 import os
+import pathlib
+import random
+import secrets
 import time
-import json
-from datetime import datetime
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate, parsedate
+from operator import itemgetter
 from urllib.parse import quote
 
+import aiohttp
 import httpx
-from fastapi import FastAPI, HTTPException, Response
-from fastapi.responses import StreamingResponse
+import numpy as np
+import orjson
+from httpx_aiohttp import AiohttpTransport
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import IdentityResponder
+from cachetools import TTLCache
 from dotenv import load_dotenv
+from upstash_redis.asyncio import Redis
 
 load_dotenv()
 
-app = FastAPI()
+# Use uvloop's faster event loop when available (uvicorn[standard] ships it,
+# except on Windows). Applies to Vercel too, where we don't control uvicorn flags.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+# Player fetch parallelism: sizes both the fetch worker pool and the
+# shared client's connection pool so one knob governs both layers
+MAX_CONCURRENCY = int(os.getenv("CR_MAX_CONCURRENCY", "100"))
+
+# Shared HTTP client pool for Clash Royale API calls (one per app lifetime)
+HTTP_MAX_CONNECTIONS = MAX_CONCURRENCY
+HTTP_KEEPALIVE_EXPIRY = 30
+HTTP_DNS_CACHE_TTL = 300
+
+
+# HTTP/2 multiplexing to the CR proxy (opt-in via CR_HTTP2=1). aiohttp only
+# speaks HTTP/1.1, so HTTP/2 uses httpx's own transport with a small pool.
+HTTP2_ENABLED = os.getenv("CR_HTTP2", "").lower() in ("1", "true", "yes")
+HTTP2_MAX_CONNECTIONS = 20
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the shared CR API client on startup and close it on shutdown.
+    By default requests go through an aiohttp connector, which handles the
+    concurrent player fan-out much better than httpx's default transport.
+    """
+    session = None
+    if HTTP2_ENABLED:
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=HTTP2_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    else:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_MAX_CONNECTIONS,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=HTTP_KEEPALIVE_EXPIRY,
+            )
+        )
+        transport = AiohttpTransport(client=session)
+
+    app.state.client = httpx.AsyncClient(
+        transport=transport,
+        base_url=CR_API_BASE,
+        headers={"Authorization": f"Bearer {API_KEY}"},
+        timeout=httpx.Timeout(15.0, connect=5.0),
+    )
+    # Separate pooled client for PostHog so the CR bearer token never leaves for it
+    app.state.posthog_client = httpx.AsyncClient(base_url=POSTHOG_HOST, timeout=5.0)
+    app.state.posthog_queue = asyncio.Queue(maxsize=POSTHOG_QUEUE_SIZE)
+    posthog_task = asyncio.create_task(posthog_worker(app.state.posthog_queue))
+    print(f"[HTTP] CR client ready ({'HTTP/2' if HTTP2_ENABLED else 'aiohttp HTTP/1.1'})")
+    try:
+        yield
+    finally:
+        posthog_task.cancel()
+        await asyncio.gather(posthog_task, return_exceptions=True)
+        await flush_posthog_queue(app.state.posthog_queue)
+        await app.state.client.aclose()
+        await app.state.posthog_client.aclose()
+        if session is not None:
+            await session.close()
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (emits bytes directly)."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+
+def get_client(request: Request) -> httpx.AsyncClient:
+    """Dependency returning the shared CR API client (override it in tests)."""
+    return request.app.state.client
 
 # ============================================================
 # Upstash KV Cache Setup
 # ============================================================
-from upstash_redis import Redis
 
-# Initialize Upstash Redis client (uses KV_REST_API_URL and KV_REST_API_TOKEN)
+# Initialize Upstash Redis client (uses KV_REST_API_URL and KV_REST_API_TOKEN).
+# The asyncio client keeps KV round-trips from blocking the event loop. It
+# returns values as str, so JSON values are always decoded with orjson.
+# Every value we store is JSON text, so the REST API's default base64 response
+# encoding only costs a Python b64decode per value (1000+ per MGET batch).
 kv_url = os.getenv("KV_REST_API_URL")
 kv_token = os.getenv("KV_REST_API_TOKEN")
 
 if kv_url and kv_token:
-    kv = Redis(url=kv_url, token=kv_token)
+    kv = Redis(url=kv_url, token=kv_token, rest_encoding=None)
     KV_ENABLED = True
     print("[KV Cache] Upstash Redis connected")
 else:
@@ -36,12 +144,12 @@ else:
 PLAYER_KV_TTL = 12 * 60 * 60
 
 
-def get_player_cache_key(tag: str) -> str:
-    """Generate cache key for a player tag."""
-    # Normalize tag (ensure it starts with #)
-    if not tag.startswith("#"):
-        tag = "#" + tag
-    return f"player:{tag}"
+def kv_dumps(value) -> str:
+    """Encode a value for KV with orjson (the Upstash client sends str, not bytes)."""
+    return orjson.dumps(value).decode()
+
+
+PLAYER_KEY_PREFIX = "player:"
 
 
 KV_BATCH_SIZE = 500  # Max keys per MGET/pipeline batch (avoids Upstash payload limits)
@@ -69,12 +177,10 @@ async def get_cached_tournament_result(tag: str) -> dict | None:
     if not KV_ENABLED:
         return None
     try:
-        data = kv.get(get_tournament_result_key(tag))
+        data = await kv.get(get_tournament_result_key(tag))
         if data is None:
             return None
-        if isinstance(data, str):
-            return json.loads(data)
-        return data
+        return orjson.loads(data)
     except Exception as e:
         print(f"[Tournament Cache] Error getting result for {tag}: {e}")
         return None
@@ -86,7 +192,7 @@ async def cache_tournament_result(tag: str, result: dict, status: str):
         return
     try:
         ttl = TOURNAMENT_RESULT_TTL_ENDED if status == "ended" else TOURNAMENT_RESULT_TTL_ACTIVE
-        kv.setex(get_tournament_result_key(tag), ttl, json.dumps(result))
+        await kv.setex(get_tournament_result_key(tag), ttl, kv_dumps(result))
         print(f"[Tournament Cache] Cached result for {tag} (TTL={ttl}s)")
     except Exception as e:
         print(f"[Tournament Cache] Error caching result for {tag}: {e}")
@@ -97,7 +203,7 @@ async def try_acquire_lock(tag: str) -> bool:
     if not KV_ENABLED:
         return True  # No KV = always proceed (no coordination)
     try:
-        result = kv.set(get_tournament_lock_key(tag), time.time(), nx=True, ex=TOURNAMENT_LOCK_TTL)
+        result = await kv.set(get_tournament_lock_key(tag), time.time(), nx=True, ex=TOURNAMENT_LOCK_TTL)
         acquired = result is True or result == "OK"
         print(f"[Tournament Lock] {'Acquired' if acquired else 'Denied'} lock for {tag}")
         return acquired
@@ -111,7 +217,7 @@ async def release_lock(tag: str):
     if not KV_ENABLED:
         return
     try:
-        kv.delete(get_tournament_lock_key(tag))
+        await kv.delete(get_tournament_lock_key(tag))
         print(f"[Tournament Lock] Released lock for {tag}")
     except Exception as e:
         print(f"[Tournament Lock] Error releasing lock for {tag}: {e}")
@@ -122,13 +228,13 @@ async def update_analysis_progress(tag: str, processed: int, total: int, summary
     if not KV_ENABLED:
         return
     try:
-        progress = json.dumps({
+        progress = kv_dumps({
             "processed": processed,
             "total": total,
             "summary": summary,
             "updated_at": time.time(),
         })
-        kv.setex(get_tournament_progress_key(tag), 60, progress)
+        await kv.setex(get_tournament_progress_key(tag), 60, progress)
     except Exception as e:
         print(f"[Tournament Progress] Error updating progress for {tag}: {e}")
 
@@ -138,12 +244,10 @@ async def get_analysis_progress(tag: str) -> dict | None:
     if not KV_ENABLED:
         return None
     try:
-        data = kv.get(get_tournament_progress_key(tag))
+        data = await kv.get(get_tournament_progress_key(tag))
         if data is None:
             return None
-        if isinstance(data, str):
-            return json.loads(data)
-        return data
+        return orjson.loads(data)
     except Exception as e:
         print(f"[Tournament Progress] Error getting progress for {tag}: {e}")
         return None
@@ -154,36 +258,79 @@ async def clear_analysis_progress(tag: str):
     if not KV_ENABLED:
         return
     try:
-        kv.delete(get_tournament_progress_key(tag))
+        await kv.delete(get_tournament_progress_key(tag))
     except Exception as e:
         print(f"[Tournament Progress] Error clearing progress for {tag}: {e}")
 
 
+# Compact KV field -> PoL season key. Cached players keep only what
+# classify_player reads: name (n), base trophies (t), PoL rank/trophies
+# per season, and the cache time as epoch seconds (s).
+KV_POL_FIELDS = (
+    ("pc", "currentPathOfLegendSeasonResult"),
+    ("pl", "lastPathOfLegendSeasonResult"),
+    ("pb", "bestPathOfLegendSeasonResult"),
+)
+
+
+def pack_cached_player(player_data: dict, cached_ts: int) -> dict:
+    """Compact KV entry for a fetched player."""
+    entry = {"n": player_data.get("name", ""), "t": player_data.get("trophies", 0), "s": cached_ts}
+    for field, key in KV_POL_FIELDS:
+        result = player_data.get(key)
+        if result:
+            entry[field] = {"rank": result.get("rank"), "trophies": result.get("trophies")}
+    return entry
+
+
+def unpack_cached_player(entry: dict) -> dict:
+    """Rebuild the player_data fields classify_player needs from a KV entry."""
+    player_data = {"name": entry.get("n", ""), "trophies": entry.get("t", 0)}
+    for field, key in KV_POL_FIELDS:
+        if field in entry:
+            player_data[key] = entry[field]
+    return player_data
+
+
 async def get_cached_players(tags: list[str]) -> dict:
     """
     Get multiple players from KV cache.
-    Returns dict of {tag: classification_data} for found players.
-    Batches MGET in chunks of KV_BATCH_SIZE to handle 10K+ players.
+    Returns dict of {tag: {name, classification, cached_at_ts}} for found
+    players (cached_at_ts is epoch seconds, absent on old entries).
+    Splits MGET into chunks of KV_BATCH_SIZE (Upstash payload limits) and
+    sends the chunks concurrently, so 10K+ players cost about one round-trip.
     """
     if not KV_ENABLED or not tags:
         return {}
 
     try:
         cached = {}
+        packed = []
+
+        # Callers pass normalized (#-prefixed) tags, so keys are a plain concat
+        keys = [PLAYER_KEY_PREFIX + tag for tag in tags]
+        batches = await asyncio.gather(*(
+            kv.mget(*keys[i:i + KV_BATCH_SIZE])
+            for i in range(0, len(keys), KV_BATCH_SIZE)
+        ))
+
+        results = (result for batch in batches for result in batch)
+        for tag, result in zip(tags, results):
+            if result is not None:
+                entry = orjson.loads(result)
+                if "classification" in entry:
+                    cached[tag] = entry  # Written before entries held raw fields
+                else:
+                    packed.append((tag, entry))
 
-        # Process in batches to avoid Upstash payload limits
-        for i in range(0, len(tags), KV_BATCH_SIZE):
-            batch_tags = tags[i:i + KV_BATCH_SIZE]
-            keys = [get_player_cache_key(tag) for tag in batch_tags]
-
-            results = kv.mget(*keys)
-
-            for j, result in enumerate(results):
-                if result is not None:
-                    if isinstance(result, str):
-                        cached[batch_tags[j]] = json.loads(result)
-                    else:
-                        cached[batch_tags[j]] = result
+        # Classify on read, so tier rule changes apply without a cache flush
+        classifications = classify_players([unpack_cached_player(entry) for _, entry in packed])
+        for (tag, entry), classification in zip(packed, classifications):
+            cached[tag] = {
+                "name": entry.get("n", ""),
+                "classification": classification,
+                "cached_at_ts": entry.get("s"),
+            }
 
         return cached
     except Exception as e:
@@ -191,84 +338,109 @@ async def get_cached_players(tags: list[str]) -> dict:
         return {}
 
 
-async def cache_players(players_data: list[dict]):
+# Bulk SET ... EX for one batch of players as a single command, instead of
+# a pipeline repeating SETEX + TTL per key.
+# KEYS = player keys; ARGV[1] = TTL seconds, ARGV[i + 1] = value for KEYS[i]
+PLAYER_BULK_SET_SCRIPT = """
+for i = 1, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[i + 1], 'EX', ARGV[1])
+end
+return #KEYS
+"""
+
+
+async def cache_players(players: list[tuple[str, dict]]):
     """
-    Cache multiple players to KV.
-    Each player_data should have 'tag' and 'classification' keys.
-    Batches pipeline operations in chunks of KV_BATCH_SIZE for 10K+ players.
+    Cache multiple fetched (tag, player_data) pairs to KV.
+    Stores the raw fields classification needs (see pack_cached_player),
+    not the classification itself.
+    Writes chunks of KV_BATCH_SIZE players (Upstash payload limits) with one
+    PLAYER_BULK_SET_SCRIPT call each, sending the chunks concurrently.
     """
-    if not KV_ENABLED or not players_data:
+    if not KV_ENABLED or not players:
         return
 
+    cached_ts = int(time.time())
+    # Tags are already normalized by the fetch
+    keys = [PLAYER_KEY_PREFIX + tag for tag, _ in players if tag]
+    values = [kv_dumps(pack_cached_player(player_data, cached_ts)) for tag, player_data in players if tag]
     try:
-        # Process in batches to avoid Upstash payload limits
-        for i in range(0, len(players_data), KV_BATCH_SIZE):
-            batch = players_data[i:i + KV_BATCH_SIZE]
-            pipe = kv.pipeline()
-
-            for player in batch:
-                tag = player.get("tag", "")
-                if tag:
-                    key = get_player_cache_key(tag)
-                    data = {
-                        "name": player.get("name", ""),
-                        "classification": player.get("classification", {}),
-                        "cached_at": datetime.now().isoformat()
-                    }
-                    pipe.setex(key, PLAYER_KV_TTL, json.dumps(data))
-
-            pipe.exec()
+        await asyncio.gather(*(
+            kv.eval(
+                PLAYER_BULK_SET_SCRIPT,
+                keys=keys[i:i + KV_BATCH_SIZE],
+                args=[PLAYER_KV_TTL, *values[i:i + KV_BATCH_SIZE]],
+            )
+            for i in range(0, len(keys), KV_BATCH_SIZE)
+        ))
     except Exception as e:
         print(f"[KV Cache] Error caching players: {e}")
 
 
+async def clear_cached_players() -> int:
+    """
+    Delete every player cache entry. SCANs for the key prefix in
+    KV_BATCH_SIZE steps and removes each page with one multi-key DEL.
+    Returns the number of keys deleted.
+    """
+    if not KV_ENABLED:
+        return 0
+
+    deleted = 0
+    cursor = 0
+    while True:
+        cursor, keys = await kv.scan(cursor, match=PLAYER_KEY_PREFIX + "*", count=KV_BATCH_SIZE)
+        if keys:
+            deleted += await kv.delete(*keys)
+        if not cursor:
+            break
+    print(f"[KV Cache] Cleared {deleted} cached players")
+    return deleted
+
+
+# Recent tournaments live in a sorted set (tag scored by search time, so a
+# repeat search just moves the tag) plus a hash of tag -> entry JSON. The
+# script adds, trims both to the newest N and refreshes the TTLs server-side,
+# so the update is one round-trip (and atomic).
+# KEYS[1] = sorted set, KEYS[2] = hash; ARGV = score, tag, entry JSON, max entries, TTL seconds
+RECENT_PUSH_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+local stale = redis.call('ZRANGE', KEYS[1], 0, -(tonumber(ARGV[4]) + 1))
+if #stale > 0 then
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(tonumber(ARGV[4]) + 1))
+    redis.call('HDEL', KEYS[2], unpack(stale))
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[5]))
+return 1
+"""
+
+
 async def add_recent_tournament(tag: str, name: str, player_count: int, status: str):
     """
     Add a tournament to the recent tournaments list.
-    Uses a Redis list with LPUSH + LTRIM to keep only the last N tournaments.
-    Deduplicates by tag.
+    Deduplicated by tag and trimmed to the last N tournaments, all in one
+    RECENT_PUSH_SCRIPT call.
     """
     if not KV_ENABLED:
         return
     
     try:
         # Create tournament entry
-        entry = json.dumps({
+        entry = kv_dumps({
             "tag": tag,
             "name": name,
             "playerCount": player_count,
             "status": status,
             "searchedAt": datetime.now().isoformat()
         })
-        
-        # Get current list to check for duplicates
-        current = kv.lrange(RECENT_TOURNAMENTS_KEY, 0, RECENT_TOURNAMENTS_MAX * 2)
-        
-        # Filter out any existing entry with the same tag
-        filtered = []
-        for item in current:
-            try:
-                parsed = json.loads(item) if isinstance(item, str) else item
-                if parsed.get("tag") != tag:
-                    filtered.append(item)
-            except:
-                continue
-        
-        # Use pipeline to rebuild the list atomically
-        pipe = kv.pipeline()
-        pipe.delete(RECENT_TOURNAMENTS_KEY)
-        
-        # Add new entry first (most recent), then existing ones
-        pipe.lpush(RECENT_TOURNAMENTS_KEY, entry)
-        for item in filtered[:RECENT_TOURNAMENTS_MAX - 1]:
-            if isinstance(item, str):
-                pipe.rpush(RECENT_TOURNAMENTS_KEY, item)
-            else:
-                pipe.rpush(RECENT_TOURNAMENTS_KEY, json.dumps(item))
-        
-        # Set TTL on the list
-        pipe.expire(RECENT_TOURNAMENTS_KEY, RECENT_TOURNAMENTS_TTL)
-        pipe.exec()
+
+        await kv.eval(
+            RECENT_PUSH_SCRIPT,
+            keys=[RECENT_TOURNAMENTS_KEY, RECENT_TOURNAMENTS_META_KEY],
+            args=[time.time(), tag, entry, RECENT_TOURNAMENTS_MAX, RECENT_TOURNAMENTS_TTL],
+        )
         
         print(f"[Recent] Added tournament: {name} ({tag})")
     except Exception as e:
@@ -281,12 +453,16 @@ async def get_recent_tournaments() -> list[dict]:
         return []
     
     try:
-        items = kv.lrange(RECENT_TOURNAMENTS_KEY, 0, RECENT_TOURNAMENTS_MAX - 1)
+        # The hash only holds the trimmed N entries, so fetch it whole
+        # alongside the ordered tags in one pipelined round-trip
+        pipe = kv.pipeline()
+        pipe.zrange(RECENT_TOURNAMENTS_KEY, 0, RECENT_TOURNAMENTS_MAX - 1, rev=True)
+        pipe.hgetall(RECENT_TOURNAMENTS_META_KEY)
+        tags, entries = await pipe.exec()
         result = []
-        for item in items:
+        for tag in tags:
             try:
-                parsed = json.loads(item) if isinstance(item, str) else item
-                result.append(parsed)
+                result.append(orjson.loads(entries[tag]))
             except:
                 continue
         return result
@@ -299,25 +475,90 @@ POSTHOG_API_KEY = os.getenv("POSTHOG_KEY", "")
 POSTHOG_HOST = "https://us.i.posthog.com"
 
 
-async def capture_event(event_name: str, distinct_id: str = "anonymous", properties: dict = None):
-    """Send event to PostHog server-side (bypasses ad blockers)."""
-    if not POSTHOG_API_KEY:
+# Events are queued and POSTed to /batch/ by a background worker, so
+# capturing never blocks a request on PostHog
+POSTHOG_QUEUE_SIZE = 10_000
+POSTHOG_BATCH_SIZE = 50
+POSTHOG_FLUSH_INTERVAL = 0.5  # seconds
+# A Vercel instance can be frozen (or reclaimed) as soon as its response is
+# done, stranding queued events, so there each request flushes its own
+# events in a background task, which runs before the invocation ends
+POSTHOG_FLUSH_PER_REQUEST = bool(os.environ.get("VERCEL"))
+
+
+def capture_event(event_name: str, distinct_id: str = "anonymous", properties: dict = None):
+    """
+    Queue an event for PostHog server-side (bypasses ad blockers).
+    Never raises: analytics must not fail the request.
+    """
+    # No queue when lifespan didn't run (e.g. TestClient without `with`)
+    queue = getattr(app.state, "posthog_queue", None)
+    if not POSTHOG_API_KEY or queue is None:
         return
-    
+
     try:
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                f"{POSTHOG_HOST}/capture/",
-                json={
-                    "api_key": POSTHOG_API_KEY,
-                    "event": event_name,
-                    "distinct_id": distinct_id,
-                    "properties": properties or {}
-                },
-                timeout=5.0
-            )
+        queue.put_nowait({
+            "event": event_name,
+            "distinct_id": distinct_id,
+            "properties": properties or {},
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        })
+    except asyncio.QueueFull:
+        print(f"[PostHog] Queue full, dropping event: {event_name}")
     except Exception as e:
-        print(f"[PostHog] Failed to capture event: {e}")
+        print(f"[PostHog] Failed to queue event: {e}")
+
+
+async def send_posthog_batch(batch: list[dict]):
+    """POST queued events to PostHog in one request."""
+    try:
+        await app.state.posthog_client.post(
+            "/batch/",
+            json={"api_key": POSTHOG_API_KEY, "batch": batch},
+        )
+    except Exception as e:
+        print(f"[PostHog] Failed to send {len(batch)} events: {e}")
+
+
+async def posthog_worker(queue: asyncio.Queue):
+    """
+    Drain the event queue for the app lifetime. Sends a batch once it holds
+    POSTHOG_BATCH_SIZE events or POSTHOG_FLUSH_INTERVAL after its first event.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + POSTHOG_FLUSH_INTERVAL
+        try:
+            while len(batch) < POSTHOG_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            await send_posthog_batch(batch)  # Don't lose a half-built batch on shutdown
+            raise
+        await send_posthog_batch(batch)
+
+
+async def flush_posthog_queue(queue: asyncio.Queue | None):
+    """
+    Send whatever is still queued (on shutdown after the worker stops, and
+    after each tracked request on Vercel).
+    """
+    if queue is None:
+        return
+    batch = []
+    while not queue.empty():
+        batch.append(queue.get_nowait())
+        if len(batch) == POSTHOG_BATCH_SIZE:
+            await send_posthog_batch(batch)
+            batch = []
+    if batch:
+        await send_posthog_batch(batch)
 
 # CORS middleware
 app.add_middleware(
@@ -328,6 +569,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def encoding_qvalues(accept_encoding: str | None) -> dict[str, float]:
+    """Content-coding -> q-value from an Accept-Encoding header (a bad q counts as 0)."""
+    qvalues = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    return qvalues
+
+
+def encoding_q(qvalues: dict[str, float], coding: str) -> float:
+    """q-value for a coding; unlisted codings fall back to `*` (else refused)."""
+    return qvalues.get(coding, qvalues.get("*", 0.0))
+
+
+class NegotiatingGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves the body alone when the client sent gzip;q=0."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            accept_encoding = Headers(scope=scope).get("accept-encoding")
+            if "gzip" in (accept_encoding or "") and encoding_q(encoding_qvalues(accept_encoding), "gzip") <= 0:
+                responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=self.exclude_content_types)
+                await responder(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
+
+
+# Compress JSON responses (analysis payloads run to hundreds of KB). Streamed
+# NDJSON chunks are sync-flushed by the middleware, so progress stays live.
+app.add_middleware(NegotiatingGZipMiddleware, minimum_size=1024)
+
 CR_API_BASE = "https://proxy.royaleapi.dev/v1"
 API_KEY = os.getenv("CR_API_KEY", "")
 
@@ -341,32 +624,74 @@ ANALYSIS_CACHE_STALE = 10 * 60  # 10 minutes stale-while-revalidate
 ANALYSIS_ENDED_CACHE_DURATION = 12 * 60 * 60  # 12 hours for ended tournaments
 
 # Recent tournaments settings
-RECENT_TOURNAMENTS_KEY = "recent_tournaments"
+# New key names: the old "recent_tournaments" list just expires on its own
+RECENT_TOURNAMENTS_KEY = "recent_tournaments:index"
+RECENT_TOURNAMENTS_META_KEY = "recent_tournaments:meta"
 RECENT_TOURNAMENTS_MAX = 5
 RECENT_TOURNAMENTS_TTL = 7 * 24 * 60 * 60  # 7 days
 
 
-def get_headers():
-    return {"Authorization": f"Bearer {API_KEY}"}
+def encode_tag(tag: str) -> str:
+    """
+    URL-encode a normalized (#-prefixed) tag.
+    Real CR tags are '#' + ASCII alphanumerics, so only the '#' needs
+    escaping; anything else (user-typed input) goes through quote().
+    """
+    body = tag[1:]
+    if body.isascii() and body.isalnum():
+        return "%23" + body
+    return quote(tag, safe="")
+
+
+# Path of Legends season results checked for rank / trophies
+POL_KEYS = ("currentPathOfLegendSeasonResult", "lastPathOfLegendSeasonResult", "bestPathOfLegendSeasonResult")
+
+# Tier tables: bisect the cut-offs to get an index into the matching tiers tuple
+RANK_CUTS = (1000, 10000, 50000)  # rank <= cut
+RANK_TIERS = (
+    ("top_1k", "Top 1K", 1),
+    ("top_10k", "Top 10K", 2),
+    ("top_50k", "Top 50K", 3),
+    ("ever_ranked", "Classé", 4),
+)
+TROPHY_CUTS = (8000, 10000, 12000)  # trophies >= cut
+TROPHY_TIERS = (
+    ("beginner", "Débutant (<8K)", 9),
+    ("casual", "Casual (8K-10K)", 8),
+    ("trophy_10k_12k", "10K-12K", 7),
+    ("reached_12k", "12K+", 6),
+)
+
+# All tiers in priority order; a tier's index here is its priority - 1
+TIERS_BY_INDEX = (*RANK_TIERS, ("final_league", "Ligue Ultime", 5), *reversed(TROPHY_TIERS))
+FINAL_LEAGUE_INDEX = len(RANK_TIERS)
+TROPHY_TIER_LAST = len(TIERS_BY_INDEX) - 1
 
+# Prebuilt classification dicts; results copy one and add rank/trophies
+TIER_TEMPLATES = tuple(
+    {"tier": tier, "label": label, "priority": priority}
+    for tier, label, priority in TIERS_BY_INDEX
+)
 
-def get_best_pol_rank(player_data):
-    """Get the best (lowest) Path of Legends rank from current, last, or best season."""
-    ranks = []
-    for key in ["currentPathOfLegendSeasonResult", "lastPathOfLegendSeasonResult", "bestPathOfLegendSeasonResult"]:
-        result = player_data.get(key, {})
-        if result and result.get("rank") is not None:
-            ranks.append(result["rank"])
-    return min(ranks) if ranks else None
+# Player fields kept from the (50-200 KB) profile payload; everything
+# else (cards, badges, achievements...) is dropped right after parsing
+PLAYER_FIELDS = ("tag", "name", "trophies", *POL_KEYS)
 
 
-def has_pol_trophies(player_data):
-    """Check if player has Path of Legends trophies (reached final league)."""
-    for key in ["currentPathOfLegendSeasonResult", "lastPathOfLegendSeasonResult", "bestPathOfLegendSeasonResult"]:
-        result = player_data.get(key, {})
-        if result and result.get("trophies") and result["trophies"] > 0:
-            return True
-    return False
+def _pol_summary(player_data):
+    """Best (lowest) PoL rank and whether any season has PoL trophies, in one pass."""
+    best_rank = None
+    has_pol_trophies = False
+    for key in POL_KEYS:
+        result = player_data.get(key)
+        if not result:
+            continue  # Most players have no PoL data for most seasons
+        rank = result.get("rank")
+        if rank is not None and (best_rank is None or rank < best_rank):
+            best_rank = rank
+        if (result.get("trophies") or 0) > 0:
+            has_pol_trophies = True
+    return best_rank, has_pol_trophies
 
 
 def classify_player(player_data):
@@ -384,66 +709,173 @@ def classify_player(player_data):
     
     Note: Seasonal trophies removed in Dec 2024 update, now using base trophies only.
     """
-    base_trophies = player_data.get("trophies", 0)
-    
-    # Check Path of Legends rank first
-    best_rank = get_best_pol_rank(player_data)
-    
+    best_rank, has_pol_trophies = _pol_summary(player_data)
+
     if best_rank is not None:
-        if best_rank <= 1000:
-            return {"tier": "top_1k", "label": "Top 1K", "rank": best_rank, "priority": 1}
-        elif best_rank <= 10000:
-            return {"tier": "top_10k", "label": "Top 10K", "rank": best_rank, "priority": 2}
-        elif best_rank <= 50000:
-            return {"tier": "top_50k", "label": "Top 50K", "rank": best_rank, "priority": 3}
-        else:
-            return {"tier": "ever_ranked", "label": "Classé", "rank": best_rank, "priority": 4}
-    
-    # Check if reached final league (has trophies but no rank)
-    if has_pol_trophies(player_data):
-        return {"tier": "final_league", "label": "Ligue Ultime", "priority": 5}
-    
+        return {**TIER_TEMPLATES[bisect_left(RANK_CUTS, best_rank)], "rank": best_rank}
+
+    # Reached final league (has trophies but no rank)
+    if has_pol_trophies:
+        return {**TIER_TEMPLATES[FINAL_LEAGUE_INDEX]}
+
     # Classify by base trophies (no more seasonal trophies since Dec 2024)
-    if base_trophies >= 12000:
-        return {"tier": "reached_12k", "label": "12K+", "trophies": base_trophies, "priority": 6}
-    elif base_trophies >= 10000:
-        return {"tier": "trophy_10k_12k", "label": "10K-12K", "trophies": base_trophies, "priority": 7}
-    elif base_trophies >= 8000:
-        return {"tier": "casual", "label": "Casual (8K-10K)", "trophies": base_trophies, "priority": 8}
-    else:
-        return {"tier": "beginner", "label": "Débutant (<8K)", "trophies": base_trophies, "priority": 9}
+    base_trophies = player_data.get("trophies", 0)
+    return {**TIER_TEMPLATES[TROPHY_TIER_LAST - bisect_right(TROPHY_CUTS, base_trophies)], "trophies": base_trophies}
+
+
+# Tournaments at least this large are classified with vectorized numpy ops
+BATCH_CLASSIFY_MIN = 500
+_NO_RANK = np.iinfo(np.int64).max
+
+
+def classify_players(players_data: list[dict]) -> list[dict]:
+    """
+    Classify many players at once; same results as classify_player.
+    Large batches extract ranks/trophies into arrays and resolve every tier
+    with a few numpy ops instead of a per-player branch ladder.
+    """
+    if len(players_data) < BATCH_CLASSIFY_MIN:
+        return [classify_player(p) for p in players_data]
+
+    best_ranks = []
+    pol_trophies = []
+    base_trophies = []
+    for player_data in players_data:
+        best_rank, has_pol_trophies = _pol_summary(player_data)
+        best_ranks.append(_NO_RANK if best_rank is None else best_rank)
+        pol_trophies.append(has_pol_trophies)
+        base_trophies.append(player_data.get("trophies", 0))
+
+    ranks = np.array(best_ranks, dtype=np.int64)
+    ranked = ranks != _NO_RANK
+    tier_idx = np.where(
+        ranked,
+        np.searchsorted(RANK_CUTS, ranks, side="left"),
+        np.where(
+            np.array(pol_trophies, dtype=bool),
+            FINAL_LEAGUE_INDEX,
+            TROPHY_TIER_LAST - np.searchsorted(TROPHY_CUTS, np.array(base_trophies, dtype=np.int64), side="right"),
+        ),
+    ).tolist()
+
+    classifications = []
+    for i, idx in enumerate(tier_idx):
+        if idx < FINAL_LEAGUE_INDEX:
+            classifications.append({**TIER_TEMPLATES[idx], "rank": best_ranks[i]})
+        elif idx == FINAL_LEAGUE_INDEX:
+            classifications.append({**TIER_TEMPLATES[idx]})
+        else:
+            classifications.append({**TIER_TEMPLATES[idx], "trophies": base_trophies[i]})
+    return classifications
+
+
+# In-process cache of projected player profiles. Lives as long as the worker
+# process (or warm serverless instance); a cold start simply begins empty.
+PLAYER_MEMORY_TTL = 5 * 60
+PLAYER_MEMORY_MAX = 50_000
+player_memory_cache = TTLCache(maxsize=PLAYER_MEMORY_MAX, ttl=PLAYER_MEMORY_TTL)
+
+# Encoded full profiles served by /api/player; far larger than the projections
+# above, so only a few are kept (Vercel's edge cache covers the rest in production)
+PLAYER_PROFILE_MAX = 500
+player_profile_cache = TTLCache(maxsize=PLAYER_PROFILE_MAX, ttl=PLAYER_MEMORY_TTL)
+
+
+def project_player(payload: dict) -> dict:
+    """Keep only PLAYER_FIELDS from a full player profile."""
+    return {key: payload[key] for key in PLAYER_FIELDS if key in payload}
+
+
+# Retry policy for player fetches (exponential backoff with jitter)
+FETCH_MAX_ATTEMPTS = 4
+FETCH_RETRY_STATUSES = (429, 502, 503, 504)
+FETCH_BACKOFF_BASE = 1.0    # seconds
+FETCH_BACKOFF_MAX = 30.0    # seconds
+FETCH_BACKOFF_JITTER = 0.5
+
+
+def get_retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Backoff delay for a retriable response, honoring Retry-After when present."""
+    try:
+        retry_after = float(response.headers.get("Retry-After", 0))
+    except ValueError:
+        retry_after = 0.0
+    backoff = FETCH_BACKOFF_BASE * 2 ** attempt * (1 + random.random() * FETCH_BACKOFF_JITTER)
+    return max(retry_after, min(FETCH_BACKOFF_MAX, backoff))
+
+
+# Player fetches currently in progress, so concurrent callers share one
+# request: tag -> [task, number of callers awaiting it]
+player_fetches_in_flight: dict[str, list] = {}
 
 
 async def fetch_player_from_api(client: httpx.AsyncClient, tag: str, base_url: str = None):
     """
-    Fetch a single player from API. Returns (tag, data, error, was_cached).
-    Does NOT retry on 429 - callers handle retries so they can release
-    the semaphore during waits.
+    Fetch a single player from API. Returns (tag, data, error, was_cached),
+    where data is projected down to PLAYER_FIELDS. Served from
+    player_memory_cache when the player was fetched recently, and joins the
+    in-flight request when another caller is already fetching the same tag.
+    The shared request is cancelled once every caller awaiting it has given
+    up (e.g. all their clients disconnected).
     """
     if not tag.startswith("#"):
         tag = "#" + tag
 
-    encoded_tag = quote(tag, safe="")
+    cached = player_memory_cache.get(tag)
+    if cached is not None:
+        return (tag, cached, None, True)
+
+    entry = player_fetches_in_flight.get(tag)
+    if entry is None:
+        entry = player_fetches_in_flight[tag] = [asyncio.ensure_future(_request_player(client, tag, base_url)), 0]
+        entry[0].add_done_callback(lambda _: _drop_in_flight(tag, entry))
+
+    task = entry[0]
+    entry[1] += 1
     try:
-        if base_url:
-            response = await client.get(
-                f"{base_url}/api/player/{encoded_tag}",
-                timeout=15.0
-            )
-        else:
-            response = await client.get(
-                f"{CR_API_BASE}/players/{encoded_tag}",
-                headers=get_headers(),
-                timeout=15.0
-            )
+        # Shielded so one caller giving up doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0 and not task.done():
+            task.cancel()  # Nobody is waiting anymore: free the connection now
+            _drop_in_flight(tag, entry)
 
-        if response.status_code == 200:
-            data = response.json()
-            was_cached = response.headers.get("x-vercel-cache") == "HIT"
-            if "_cachedAt" not in data:
-                data["_cachedAt"] = datetime.now().isoformat()
-            return (tag, data, None, was_cached)
-        elif response.status_code == 404:
+
+def _drop_in_flight(tag: str, entry: list):
+    """Forget an in-flight fetch, unless the tag has since started a new one."""
+    if player_fetches_in_flight.get(tag) is entry:
+        del player_fetches_in_flight[tag]
+
+
+async def _request_player(client: httpx.AsyncClient, tag: str, base_url: str = None):
+    """
+    Request a player from the API (tag already normalized).
+    Retries 429 and 5xx gateway errors up to FETCH_MAX_ATTEMPTS times with
+    exponential backoff + jitter.
+    """
+    encoded_tag = encode_tag(tag)
+    if base_url:
+        url = f"{base_url}/api/player/{encoded_tag}"
+    else:
+        url = f"/players/{encoded_tag}"
+
+    try:
+        for attempt in range(FETCH_MAX_ATTEMPTS):
+            response = await client.get(url, timeout=15.0)
+
+            if response.status_code == 200:
+                data = project_player(orjson.loads(response.content))
+                was_cached = response.headers.get("x-vercel-cache") == "HIT"
+                player_memory_cache[tag] = data
+                return (tag, data, None, was_cached)
+
+            if response.status_code in FETCH_RETRY_STATUSES and attempt < FETCH_MAX_ATTEMPTS - 1:
+                await asyncio.sleep(get_retry_delay(response, attempt))
+                continue
+            break
+
+        if response.status_code == 404:
             return (tag, None, "Player not found", False)
         elif response.status_code == 429:
             return (tag, None, "Rate limited (429)", False)
@@ -455,24 +887,24 @@ async def fetch_player_from_api(client: httpx.AsyncClient, tag: str, base_url: s
         return (tag, None, str(e), False)
 
 
-import asyncio
-
 
 class _RateLimiter:
-    """Paces async requests to a max rate per second to avoid 429s."""
+    """
+    Paces async requests to a max rate per second to avoid 429s.
+    Each caller reserves the next free slot and sleeps until it; the event loop
+    is single-threaded, so the reservation needs no lock.
+    """
 
     def __init__(self, per_second: float):
         self._interval = 1.0 / per_second
-        self._last = 0.0
-        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
 
     async def acquire(self):
-        async with self._lock:
-            now = time.time()
-            wait = self._last + self._interval - now
-            if wait > 0:
-                await asyncio.sleep(wait)
-            self._last = time.time()
+        now = time.monotonic()
+        slot = max(self._next_slot, now)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
 
 
 # Get the base URL for internal API calls (for caching)
@@ -489,7 +921,58 @@ def get_vercel_url():
     return None
 
 
-async def analyze_tournament_players(members_list):
+FETCH_WORKERS = MAX_CONCURRENCY  # Long-lived workers draining the player fetch queue
+
+
+async def iter_player_fetches(client: httpx.AsyncClient, tags: list[str]):
+    """
+    Fetch players with a fixed pool of FETCH_WORKERS workers pulling tags
+    from a queue, yielding each fetch_player_from_api result as it lands.
+    Only the workers are live tasks, regardless of tournament size.
+    """
+    rate_limiter = _RateLimiter(50)
+    tag_queue = asyncio.Queue()
+    for ptag in tags:
+        tag_queue.put_nowait(ptag)
+    results = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                ptag = tag_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await rate_limiter.acquire()
+            results.put_nowait(await fetch_player_from_api(client, ptag, None))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(FETCH_WORKERS, len(tags)))]
+    try:
+        for _ in range(len(tags)):
+            yield await results.get()
+    finally:
+        # Also runs when the request is aborted: tear every worker down before
+        # returning instead of leaving them to finish in the background
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def members_by_tag(members_list) -> dict[str, dict]:
+    """
+    Map normalized (#-prefixed) tag -> member, first occurrence wins, so a
+    player listed twice is only looked up and fetched once.
+    """
+    tag_to_member = {}
+    for member in members_list:
+        tag = member.get("tag", "")
+        if tag:
+            if not tag.startswith("#"):
+                tag = "#" + tag
+            tag_to_member.setdefault(tag, member)
+    return tag_to_member
+
+
+async def analyze_tournament_players(client: httpx.AsyncClient, members_list):
     """
     Analyze all players in a tournament using KV cache + async fetching.
     
@@ -511,50 +994,28 @@ async def analyze_tournament_players(members_list):
     api_fetches = 0
     
     # Initialize summary counters
-    tier_counts = {
-        "top_1k": 0,
-        "top_10k": 0,
-        "top_50k": 0,
-        "ever_ranked": 0,
-        "final_league": 0,
-        "reached_12k": 0,
-        "trophy_10k_12k": 0,
-        "casual": 0,
-        "beginner": 0,
-    }
+    tier_counts = _new_tier_counts()
     
     start_time = time.time()
     
-    # Step 1: Extract all player tags
-    all_tags = []
-    tag_to_member = {}
-    for member in members_list:
-        tag = member.get("tag", "")
-        if tag:
-            if not tag.startswith("#"):
-                tag = "#" + tag
-            all_tags.append(tag)
-            tag_to_member[tag] = member
+    # Step 1: Extract all (unique) player tags
+    tag_to_member = members_by_tag(members_list)
+    all_tags = list(tag_to_member)
     
     # Step 2: Check KV cache for all players
     cached_players = await get_cached_players(all_tags)
     cache_hits = len(cached_players)
     
-    # Process cached players and track oldest cache time
-    oldest_cache_time = None
-    
+    # Oldest cache entry, as one min() over the numeric epoch stamps
+    oldest_cache_ts = min(
+        (ts for ts in (data.get("cached_at_ts") for data in cached_players.values()) if ts),
+        default=None,
+    )
+
     for tag, cached_data in cached_players.items():
         member = tag_to_member.get(tag, {})
         classification = cached_data.get("classification", {})
-        
-        # Track oldest cache time
-        cached_at = cached_data.get("cached_at")
-        if cached_at:
-            if oldest_cache_time is None or cached_at < oldest_cache_time:
-                oldest_cache_time = cached_at
-        
         if classification and classification.get("tier"):
-            tier_counts[classification["tier"]] += 1
             results.append({
                 "tag": tag,
                 "name": cached_data.get("name", member.get("name", "Unknown")),
@@ -563,80 +1024,59 @@ async def analyze_tournament_players(members_list):
                 "classification": classification,
                 "_fromCache": True,
             })
+
+    _count_tiers(tier_counts, [result["classification"] for result in results])
     
     # Step 3: Find players NOT in cache
     tags_to_fetch = [tag for tag in all_tags if tag not in cached_players]
     
     # Step 4: Fetch missing players from API
-    new_players_to_cache = []
-    
     if tags_to_fetch:
-        async with httpx.AsyncClient() as client:
-            rate_limiter = _RateLimiter(50)
+        fetched = []
+        async for tag, player_data, error, was_cached in iter_player_fetches(client, tags_to_fetch):
+            if error:
+                errors.append({"tag": tag, "error": error})
+            elif player_data:
+                if was_cached:
+                    cache_hits += 1
+                else:
+                    api_fetches += 1
+                fetched.append((tag, player_data, was_cached))
 
-            async def fetch_paced(ptag):
-                await rate_limiter.acquire()
-                return await fetch_player_from_api(client, ptag, None)
+        # Classify all fetched players in one batch
+        classifications = classify_players([player_data for _, player_data, _ in fetched])
 
-            tasks = [fetch_paced(tag) for tag in tags_to_fetch]
+        _count_tiers(tier_counts, classifications)
+        for (tag, player_data, was_cached), classification in zip(fetched, classifications):
+            member = tag_to_member.get(tag, {})
+            results.append({
+                "tag": tag,
+                "name": player_data.get("name", member.get("name", "Unknown")),
+                "tournamentRank": member.get("rank"),
+                "tournamentScore": member.get("score"),
+                "classification": classification,
+                "_fromCache": was_cached,
+            })
 
-            for coro in asyncio.as_completed(tasks):
-                tag, player_data, error, _ = await coro
-                
-                if error:
-                    errors.append({"tag": tag, "error": error})
-                elif player_data:
-                    api_fetches += 1
-                    classification = classify_player(player_data)
-                    tier_counts[classification["tier"]] += 1
-                    
-                    member = tag_to_member.get(tag, {})
-                    player_result = {
-                        "tag": tag,
-                        "name": player_data.get("name", member.get("name", "Unknown")),
-                        "tournamentRank": member.get("rank"),
-                        "tournamentScore": member.get("score"),
-                        "classification": classification,
-                        "_fromCache": False,
-                    }
-                    results.append(player_result)
-                    
-                    # Prepare for caching
-                    new_players_to_cache.append({
-                        "tag": tag,
-                        "name": player_data.get("name", ""),
-                        "classification": classification,
-                    })
-    
-    # Step 5: Cache new players
-    if new_players_to_cache:
-        await cache_players(new_players_to_cache)
+        # Step 5: Cache new players
+        await cache_players([(tag, player_data) for tag, player_data, _ in fetched])
     
     elapsed = time.time() - start_time
     
     # Calculate percentages
     successful = len(results)
-    summary = {}
-    for tier, count in tier_counts.items():
-        summary[tier] = {
-            "count": count,
-            "percent": round(count / successful * 100, 1) if successful > 0 else 0
-        }
+    summary = _build_summary(tier_counts, successful)
     
     # Calculate cache expiry time if we have cached data
     cache_info = {}
-    if oldest_cache_time and cache_hits > 0:
-        try:
-            from datetime import datetime, timedelta
-            cached_dt = datetime.fromisoformat(oldest_cache_time.replace('Z', '+00:00'))
-            expires_dt = cached_dt + timedelta(seconds=PLAYER_KV_TTL)
-            cache_info = {
-                "oldest_cached_at": oldest_cache_time,
-                "expires_at": expires_dt.isoformat(),
-                "ttl_hours": PLAYER_KV_TTL / 3600,
-            }
-        except:
-            pass
+    if oldest_cache_ts and cache_hits > 0:
+        cached_dt = datetime.fromtimestamp(oldest_cache_ts)
+        expires_dt = cached_dt + timedelta(seconds=PLAYER_KV_TTL)
+        cache_info = {
+            "oldest_cached_at": cached_dt.isoformat(),
+            "expires_at": expires_dt.isoformat(),
+            "ttl_hours": PLAYER_KV_TTL / 3600,
+        }
     
     return {
         "players": results,
@@ -654,8 +1094,32 @@ async def analyze_tournament_players(members_list):
     }
 
 
+def analysis_etag(tournament_info: dict, analysis: dict) -> str:
+    """Weak ETag for an analysis body (ignores the per-response _cached_at stamp)."""
+    digest = hashlib.blake2b(orjson.dumps([tournament_info, analysis]), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    """
+    Whether an If-None-Match header value lists the given ETag, using the
+    weak comparison If-None-Match calls for (W/ prefixes are ignored).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == opaque for t in if_none_match.split(","))
+
+
 @app.get("/api/tournament/{tag:path}/analyze")
-async def analyze_tournament(tag: str, response: Response):
+async def analyze_tournament(
+    tag: str,
+    background_tasks: BackgroundTasks,
+    client: httpx.AsyncClient = Depends(get_client),
+    if_none_match: str | None = Header(default=None),
+):
     """
     Analyze all players in a tournament.
     This fetches each player's profile and classifies them.
@@ -663,64 +1127,104 @@ async def analyze_tournament(tag: str, response: Response):
     Cached at Vercel's edge:
     - Ended tournaments: 12 hours
     - Active/prep tournaments: 5 minutes
+
+    Results carry an ETag; a repeat request for an unchanged result gets
+    304 Not Modified instead of the body.
     """
     if not API_KEY:
         raise HTTPException(status_code=500, detail="API key not configured")
 
     if not tag.startswith("#"):
         tag = "#" + tag
-    encoded_tag = quote(tag, safe="")
+    encoded_tag = encode_tag(tag)
 
     # First, fetch the tournament to get members list (longer timeout for 10K tournaments)
-    async with httpx.AsyncClient() as client:
-        try:
-            api_response = await client.get(
-                f"{CR_API_BASE}/tournaments/{encoded_tag}",
-                headers=get_headers(),
-                timeout=30.0
-            )
-            
-            if api_response.status_code != 200:
-                raise HTTPException(status_code=api_response.status_code, detail=f"Tournament API error: {api_response.status_code}")
-            
-            tournament_data = api_response.json()
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=500, detail=f"Failed to fetch tournament: {e}")
+    try:
+        api_response = await client.get(
+            f"/tournaments/{encoded_tag}",
+            timeout=30.0
+        )
+
+        if api_response.status_code != 200:
+            raise HTTPException(status_code=api_response.status_code, detail=f"Tournament API error: {api_response.status_code}")
+
+        tournament_data = orjson.loads(api_response.content)
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch tournament: {e}")
 
     members_list = tournament_data.get("membersList", [])
     tournament_status = tournament_data.get("status", "")
     tournament_name = tournament_data.get("name", "Unknown")
 
+    tournament_info = {
+        "tag": tournament_data.get("tag"),
+        "name": tournament_data.get("name"),
+        "status": tournament_data.get("status"),
+        "capacity": tournament_data.get("capacity"),
+        "maxCapacity": tournament_data.get("maxCapacity"),
+    }
+
+    # Nothing to analyze yet (e.g. no one joined): skip the result cache
+    # read and write, the analysis is empty either way
+    if not members_list:
+        background_tasks.add_task(
+            add_recent_tournament,
+            tag=tag,
+            name=tournament_name,
+            player_count=0,
+            status=tournament_status
+        )
+        return ORJSONResponse({
+            "tournament": tournament_info,
+            "analysis": {
+                "players": [],
+                "summary": _build_summary(_new_tier_counts(), 0),
+                "stats": {
+                    "total": 0,
+                    "successful": 0,
+                    "errors": 0,
+                    "from_cache": 0,
+                    "from_api": 0,
+                    "cache_enabled": KV_ENABLED,
+                    "cache_info": {},
+                },
+                "errors": [],
+            },
+            "elapsed_seconds": 0,
+            "_cached_at": datetime.now().isoformat(),
+        })
+
     # Check tournament-level result cache (Redis KV)
     cached_result = await get_cached_tournament_result(tag)
     if cached_result:
         print(f"[Tournament Cache] HIT for {tag} (non-streaming)")
+        analysis = {
+            "summary": cached_result["summary"],
+            "stats": cached_result["stats"],
+        }
         # Set short edge cache headers for cached results
-        response.headers["Cache-Control"] = "public, s-maxage=60, stale-while-revalidate=120"
-        return {
-            "tournament": {
-                "tag": tournament_data.get("tag"),
-                "name": tournament_data.get("name"),
-                "status": tournament_data.get("status"),
-                "capacity": tournament_data.get("capacity"),
-                "maxCapacity": tournament_data.get("maxCapacity"),
-            },
-            "analysis": {
-                "summary": cached_result["summary"],
-                "stats": cached_result["stats"],
-            },
+        cache_headers = {
+            "Cache-Control": "public, s-maxage=60, stale-while-revalidate=120",
+            "ETag": analysis_etag(tournament_info, analysis),
+        }
+        if etag_matches(cache_headers["ETag"], if_none_match):
+            return Response(status_code=304, headers=cache_headers)
+        return ORJSONResponse({
+            "tournament": tournament_info,
+            "analysis": analysis,
             "elapsed_seconds": 0,
             "_cached_at": datetime.now().isoformat(),
             "_from_tournament_cache": True,
-        }
+        }, headers=cache_headers)
 
     # Analyze all players
     start_time = time.time()
-    analysis = await analyze_tournament_players(members_list)
+    analysis = await analyze_tournament_players(client, members_list)
     elapsed = time.time() - start_time
 
-    # Add to recent tournaments list (non-blocking)
-    await add_recent_tournament(
+    # Add to recent tournaments list once the response is sent (nothing here reads it)
+    background_tasks.add_task(
+        add_recent_tournament,
         tag=tag,
         name=tournament_name,
         player_count=len(members_list),
@@ -742,31 +1246,44 @@ async def analyze_tournament(tag: str, response: Response):
         cache_duration = ANALYSIS_CACHE_DURATION
         stale_duration = ANALYSIS_CACHE_STALE
 
-    # Set Vercel edge cache headers
-    response.headers["Cache-Control"] = f"public, s-maxage={cache_duration}, stale-while-revalidate={stale_duration}"
-    response.headers["CDN-Cache-Control"] = f"public, max-age={cache_duration}"
-    response.headers["Vercel-CDN-Cache-Control"] = f"public, max-age={cache_duration}"
+    # Set Vercel edge cache headers. The ETag covers the summary and stats
+    # just cached, the same value a tournament-cache hit computes, so the
+    # next identical poll can already get a 304.
+    cache_headers = {
+        "Cache-Control": f"public, s-maxage={cache_duration}, stale-while-revalidate={stale_duration}",
+        "CDN-Cache-Control": f"public, max-age={cache_duration}",
+        "Vercel-CDN-Cache-Control": f"public, max-age={cache_duration}",
+        "ETag": analysis_etag(tournament_info, {"summary": analysis["summary"], "stats": analysis["stats"]}),
+    }
+    if etag_matches(cache_headers["ETag"], if_none_match):
+        return Response(status_code=304, headers=cache_headers)
 
-    return {
-        "tournament": {
-            "tag": tournament_data.get("tag"),
-            "name": tournament_data.get("name"),
-            "status": tournament_data.get("status"),
-            "capacity": tournament_data.get("capacity"),
-            "maxCapacity": tournament_data.get("maxCapacity"),
-        },
+    # Returned as a response so the per-player list skips jsonable_encoder and
+    # is encoded exactly once
+    return ORJSONResponse({
+        "tournament": tournament_info,
         "analysis": analysis,
         "elapsed_seconds": round(elapsed, 1),
         "_cached_at": datetime.now().isoformat(),
         "_cache_duration_seconds": cache_duration,
-    }
+    }, headers=cache_headers)
+
+
+def ndjson_line(event: dict) -> bytes:
+    """Encode one stream event as an NDJSON line."""
+    return orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE)
 
 
 STREAM_BATCH_SIZE = 500  # Players per batch in streaming analysis
+STREAM_PROGRESS_INTERVAL = 1.0  # Max seconds between progress events
+
+# No caching, no sniffing, and no proxy buffering (nginx honors X-Accel-Buffering)
+# so each NDJSON line reaches the browser as soon as it is yielded
+STREAM_HEADERS = {"X-Content-Type-Options": "nosniff", "Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
 
 @app.get("/api/tournament/{tag:path}/analyze-stream")
-async def analyze_tournament_stream(tag: str):
+async def analyze_tournament_stream(tag: str, client: httpx.AsyncClient = Depends(get_client)):
     """
     Streaming analysis for large tournaments (1K+ players).
     Streams NDJSON events as players are processed in batches.
@@ -786,26 +1303,24 @@ async def analyze_tournament_stream(tag: str):
 
     if not tag.startswith("#"):
         tag = "#" + tag
-    encoded_tag = quote(tag, safe="")
+    encoded_tag = encode_tag(tag)
 
     # Fetch tournament data first (before streaming)
-    async with httpx.AsyncClient() as client:
-        try:
-            api_response = await client.get(
-                f"{CR_API_BASE}/tournaments/{encoded_tag}",
-                headers=get_headers(),
-                timeout=30.0
-            )
+    try:
+        api_response = await client.get(
+            f"/tournaments/{encoded_tag}",
+            timeout=30.0
+        )
 
-            if api_response.status_code != 200:
-                raise HTTPException(
-                    status_code=api_response.status_code,
-                    detail=f"Tournament API error: {api_response.status_code}"
-                )
+        if api_response.status_code != 200:
+            raise HTTPException(
+                status_code=api_response.status_code,
+                detail=f"Tournament API error: {api_response.status_code}"
+            )
 
-            tournament_data = api_response.json()
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=500, detail=f"Failed to fetch tournament: {e}")
+        tournament_data = orjson.loads(api_response.content)
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch tournament: {e}")
 
     members_list = tournament_data.get("membersList", [])
     tournament_status = tournament_data.get("status", "")
@@ -820,29 +1335,53 @@ async def analyze_tournament_stream(tag: str):
         "maxCapacity": tournament_data.get("maxCapacity"),
     }
 
+    # Nothing to analyze yet: answer immediately, without KV or the lock
+    if not total:
+        async def generate_empty():
+            yield ndjson_line({
+                "type": "init",
+                "tournament": tournament_info,
+                "total": 0,
+            })
+            yield ndjson_line({
+                "type": "complete",
+                "summary": _build_summary(_new_tier_counts(), 0),
+                "stats": {
+                    "total": 0, "successful": 0, "errors": 0,
+                    "from_cache": 0, "from_api": 0, "cache_enabled": KV_ENABLED,
+                },
+                "elapsed_seconds": 0,
+            })
+
+        return StreamingResponse(
+            generate_empty(),
+            media_type="text/plain",
+            headers=STREAM_HEADERS,
+        )
+
     # Check tournament-level result cache first
     cached_result = await get_cached_tournament_result(tag)
     if cached_result:
         print(f"[Tournament Cache] HIT for {tag} — returning instantly")
 
         async def generate_cached():
-            yield json.dumps({
+            yield ndjson_line({
                 "type": "init",
                 "tournament": tournament_info,
                 "total": total,
-            }) + "\n"
-            yield json.dumps({
+            })
+            yield ndjson_line({
                 "type": "complete",
                 "summary": cached_result["summary"],
                 "stats": cached_result["stats"],
                 "elapsed_seconds": 0,
                 "_from_tournament_cache": True,
-            }) + "\n"
+            })
 
         return StreamingResponse(
             generate_cached(),
             media_type="text/plain",
-            headers={"X-Content-Type-Options": "nosniff", "Cache-Control": "no-cache"},
+            headers=STREAM_HEADERS,
         )
 
     # Try to acquire the analysis lock
@@ -853,31 +1392,20 @@ async def analyze_tournament_stream(tag: str):
         async def generate_analysis():
             start_time = time.time()
             try:
-                yield json.dumps({
+                yield ndjson_line({
                     "type": "init",
                     "tournament": tournament_info,
                     "total": total,
-                }) + "\n"
-
-                # Extract all player tags
-                all_tags = []
-                tag_to_member = {}
-                for member in members_list:
-                    ptag = member.get("tag", "")
-                    if ptag:
-                        if not ptag.startswith("#"):
-                            ptag = "#" + ptag
-                        all_tags.append(ptag)
-                        tag_to_member[ptag] = member
+                })
+
+                # Extract all (unique) player tags
+                tag_to_member = members_by_tag(members_list)
+                all_tags = list(tag_to_member)
 
                 # Check KV cache for all players (batched internally)
                 cached_players = await get_cached_players(all_tags)
 
-                tier_counts = {
-                    "top_1k": 0, "top_10k": 0, "top_50k": 0,
-                    "ever_ranked": 0, "final_league": 0, "reached_12k": 0,
-                    "trophy_10k_12k": 0, "casual": 0, "beginner": 0,
-                }
+                tier_counts = _new_tier_counts()
 
                 successful = 0
                 errors_count = 0
@@ -885,91 +1413,80 @@ async def analyze_tournament_stream(tag: str):
                 api_fetches = 0
 
                 # Process cached players
-                for ptag, cached_data in cached_players.items():
-                    classification = cached_data.get("classification", {})
-                    if classification and classification.get("tier"):
-                        tier_counts[classification["tier"]] += 1
-                        successful += 1
+                cached_classifications = [
+                    classification
+                    for classification in (data.get("classification") for data in cached_players.values())
+                    if classification and classification.get("tier")
+                ]
+                _count_tiers(tier_counts, cached_classifications)
+                successful += len(cached_classifications)
 
                 tags_to_fetch = [t for t in all_tags if t not in cached_players]
 
                 # Send initial progress after cache check
                 current_summary = _build_summary(tier_counts, successful)
-                yield json.dumps({
+                yield ndjson_line({
                     "type": "progress",
                     "processed": successful,
                     "total": total,
                     "from_cache": cache_hits,
                     "from_api": 0,
                     "batch_summary": current_summary,
-                }) + "\n"
+                })
 
                 # Share progress with waiters
-                await update_analysis_progress(tag, successful + cache_hits, total, current_summary)
+                await update_analysis_progress(tag, successful, total, current_summary)
 
                 # Fetch uncached players
                 if tags_to_fetch:
-                    async with httpx.AsyncClient() as client:
-                        rate_limiter = _RateLimiter(50)
-                        pending_cache = []
-                        completed_since_last_update = 0
-
-                        async def fetch_paced(ptag):
-                            await rate_limiter.acquire()
-                            return await fetch_player_from_api(client, ptag, None)
-
-                        all_tasks = [fetch_paced(t) for t in tags_to_fetch]
-
-                        for coro in asyncio.as_completed(all_tasks):
-                            ptag, player_data, error, _ = await coro
-                            completed_since_last_update += 1
-
-                            if error:
-                                errors_count += 1
-                            elif player_data:
+                    pending_players = []
+                    completed_since_last_update = 0
+                    last_update = time.time()
+
+                    async for ptag, player_data, error, was_cached in iter_player_fetches(client, tags_to_fetch):
+                        completed_since_last_update += 1
+
+                        if error:
+                            errors_count += 1
+                        elif player_data:
+                            if was_cached:
+                                cache_hits += 1
+                            else:
                                 api_fetches += 1
-                                classification = classify_player(player_data)
-                                tier_counts[classification["tier"]] += 1
-                                successful += 1
-
-                                pending_cache.append({
-                                    "tag": ptag,
-                                    "name": player_data.get("name", ""),
-                                    "classification": classification,
-                                })
-
-                            if completed_since_last_update >= STREAM_BATCH_SIZE:
-                                completed_since_last_update = 0
-
-                                if pending_cache:
-                                    await cache_players(pending_cache)
-                                    pending_cache = []
-
-                                current_summary = _build_summary(tier_counts, successful)
-                                processed_total = successful + errors_count + cache_hits
-
-                                yield json.dumps({
-                                    "type": "progress",
-                                    "processed": processed_total,
-                                    "total": total,
-                                    "from_cache": cache_hits,
-                                    "from_api": api_fetches,
-                                    "batch_summary": current_summary,
-                                }) + "\n"
-
-                                # Share progress with waiters
-                                await update_analysis_progress(tag, processed_total, total, current_summary)
-
-                        if pending_cache:
-                            await cache_players(pending_cache)
+                            pending_players.append((ptag, player_data))
+
+                        # Flush every batch, or sooner so small tournaments render progressively
+                        if (
+                            completed_since_last_update >= STREAM_BATCH_SIZE
+                            or time.time() - last_update >= STREAM_PROGRESS_INTERVAL
+                        ):
+                            completed_since_last_update = 0
+                            last_update = time.time()
+
+                            if pending_players:
+                                successful += await _classify_and_cache(pending_players, tier_counts)
+                                pending_players = []
+
+                            current_summary = _build_summary(tier_counts, successful)
+                            processed_total = successful + errors_count
+
+                            yield ndjson_line({
+                                "type": "progress",
+                                "processed": processed_total,
+                                "total": total,
+                                "from_cache": cache_hits,
+                                "from_api": api_fetches,
+                                "batch_summary": current_summary,
+                            })
+
+                            # Share progress with waiters
+                            await update_analysis_progress(tag, processed_total, total, current_summary)
+
+                    if pending_players:
+                        successful += await _classify_and_cache(pending_players, tier_counts)
 
                 elapsed = time.time() - start_time
 
-                await add_recent_tournament(
-                    tag=tag, name=tournament_name,
-                    player_count=total, status=tournament_status,
-                )
-
                 final_summary = _build_summary(tier_counts, successful)
                 final_stats = {
                     "total": total,
@@ -980,19 +1497,26 @@ async def analyze_tournament_stream(tag: str):
                     "cache_enabled": KV_ENABLED,
                 }
 
-                # Cache the tournament result for other users
-                await cache_tournament_result(tag, {
-                    "summary": final_summary,
-                    "stats": final_stats,
-                    "elapsed_seconds": round(elapsed, 1),
-                }, tournament_status)
+                # Cache the tournament result for other users, and record the
+                # search, in overlapping KV round-trips
+                await asyncio.gather(
+                    cache_tournament_result(tag, {
+                        "summary": final_summary,
+                        "stats": final_stats,
+                        "elapsed_seconds": round(elapsed, 1),
+                    }, tournament_status),
+                    add_recent_tournament(
+                        tag=tag, name=tournament_name,
+                        player_count=total, status=tournament_status,
+                    ),
+                )
 
-                yield json.dumps({
+                yield ndjson_line({
                     "type": "complete",
                     "summary": final_summary,
                     "stats": final_stats,
                     "elapsed_seconds": round(elapsed, 1),
-                }) + "\n"
+                })
 
             finally:
                 await release_lock(tag)
@@ -1001,19 +1525,19 @@ async def analyze_tournament_stream(tag: str):
         return StreamingResponse(
             generate_analysis(),
             media_type="text/plain",
-            headers={"X-Content-Type-Options": "nosniff", "Cache-Control": "no-cache"},
+            headers=STREAM_HEADERS,
         )
 
     else:
         # === WAITER PATH: another request is already analyzing ===
         async def generate_waiting():
-            yield json.dumps({
+            yield ndjson_line({
                 "type": "init",
                 "tournament": tournament_info,
                 "total": total,
-            }) + "\n"
+            })
 
-            yield json.dumps({"type": "waiting"}) + "\n"
+            yield ndjson_line({"type": "waiting"})
 
             wait_start = time.time()
             max_wait = 280  # seconds — just under Vercel's 300s limit
@@ -1025,84 +1549,116 @@ async def analyze_tournament_stream(tag: str):
                 result = await get_cached_tournament_result(tag)
                 if result:
                     print(f"[Tournament Wait] Result available for {tag}")
-                    yield json.dumps({
+                    yield ndjson_line({
                         "type": "complete",
                         "summary": result["summary"],
                         "stats": result["stats"],
                         "elapsed_seconds": result.get("elapsed_seconds", 0),
                         "_from_tournament_cache": True,
-                    }) + "\n"
+                    })
                     return
 
                 # Relay progress from the analyzer
                 progress = await get_analysis_progress(tag)
                 if progress:
-                    yield json.dumps({
+                    yield ndjson_line({
                         "type": "progress",
                         "processed": progress["processed"],
                         "total": progress["total"],
                         "from_cache": 0,
                         "from_api": 0,
                         "batch_summary": progress.get("summary", {}),
-                    }) + "\n"
+                    })
 
             # Timed out waiting — tell client to retry
-            yield json.dumps({
+            yield ndjson_line({
                 "type": "error",
                 "message": "L'analyse est toujours en cours. Réessayez dans quelques instants.",
-            }) + "\n"
+            })
 
         return StreamingResponse(
             generate_waiting(),
             media_type="text/plain",
-            headers={"X-Content-Type-Options": "nosniff", "Cache-Control": "no-cache"},
+            headers=STREAM_HEADERS,
         )
 
 
+TIER_ORDER = tuple(tier for tier, _, _ in TIERS_BY_INDEX)
+
+
+def _new_tier_counts() -> dict:
+    """Zeroed tier counters, in priority order."""
+    return dict.fromkeys(TIER_ORDER, 0)
+
+
+_get_tier = itemgetter("tier")
+
+
+def _count_tiers(tier_counts: dict, classifications: list[dict]):
+    """Add a batch of classifications to tier_counts (tallied by Counter in C)."""
+    for tier, count in Counter(map(_get_tier, classifications)).items():
+        tier_counts[tier] += count
+
+
+async def _classify_and_cache(players: list[tuple[str, dict]], tier_counts: dict) -> int:
+    """
+    Batch-classify fetched (tag, player_data) pairs, add them to tier_counts
+    and cache them in KV. Returns the number of players classified.
+    """
+    classifications = classify_players([player_data for _, player_data in players])
+    _count_tiers(tier_counts, classifications)
+    await cache_players(players)
+    return len(classifications)
+
+
 def _build_summary(tier_counts: dict, successful: int) -> dict:
-    """Build tier summary with counts and percentages."""
-    summary = {}
-    for tier, count in tier_counts.items():
-        summary[tier] = {
-            "count": count,
-            "percent": round(count / successful * 100, 1) if successful > 0 else 0
-        }
-    return summary
+    """Build tier summary with counts and percentages (one vectorized divide)."""
+    if successful <= 0:
+        return {tier: {"count": count, "percent": 0} for tier, count in tier_counts.items()}
+    counts = np.fromiter(tier_counts.values(), dtype=np.int64, count=len(tier_counts))
+    percents = np.round(counts / successful * 100, 1).tolist()
+    return {
+        tier: {"count": count, "percent": percent}
+        for (tier, count), percent in zip(tier_counts.items(), percents)
+    }
 
 
 @app.get("/api/tournament/{tag:path}/full")
-async def get_tournament_full(tag: str):
+async def get_tournament_full(tag: str, client: httpx.AsyncClient = Depends(get_client)):
     """Get full tournament data including all members."""
     if not API_KEY:
         raise HTTPException(status_code=500, detail="API key not configured")
 
     if not tag.startswith("#"):
         tag = "#" + tag
-    encoded_tag = quote(tag, safe="")
+    encoded_tag = encode_tag(tag)
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{CR_API_BASE}/tournaments/{encoded_tag}",
-                headers=get_headers(),
-                timeout=10.0
-            )
+    try:
+        response = await client.get(
+            f"/tournaments/{encoded_tag}",
+            timeout=10.0
+        )
 
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
-                raise HTTPException(status_code=404, detail="Tournament not found")
-            else:
-                raise HTTPException(status_code=response.status_code, detail=f"API error: {response.status_code}")
+        if response.status_code == 200:
+            # Pass the upstream JSON through untouched (no parse/re-encode)
+            return Response(content=response.content, media_type="application/json")
+        elif response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Tournament not found")
+        else:
+            raise HTTPException(status_code=response.status_code, detail=f"API error: {response.status_code}")
 
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="Request timeout")
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="Request timeout")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/tournament/{tag:path}")
-async def get_tournament(tag: str):
+async def get_tournament(
+    tag: str,
+    background_tasks: BackgroundTasks,
+    client: httpx.AsyncClient = Depends(get_client),
+):
     """Get tournament summary for dashboard display."""
     if not API_KEY:
         raise HTTPException(status_code=500, detail="API key not configured. Check your .env file.")
@@ -1110,55 +1666,60 @@ async def get_tournament(tag: str):
     # Ensure tag starts with # and encode it
     if not tag.startswith("#"):
         tag = "#" + tag
-    encoded_tag = quote(tag, safe="")
+    encoded_tag = encode_tag(tag)
 
-    url = f"{CR_API_BASE}/tournaments/{encoded_tag}"
+    url = f"/tournaments/{encoded_tag}"
 
-    # Retry up to 3 times with increasing timeout
+    # Retry up to 3 times with increasing timeout; rate limits and gateway
+    # errors back off like player fetches (get_retry_delay)
     max_retries = 3
-    async with httpx.AsyncClient() as client:
-        for attempt in range(max_retries):
-            try:
-                timeout = 15 + (attempt * 10)  # 15s, 25s, 35s
-                response = await client.get(url, headers=get_headers(), timeout=float(timeout))
-                break  # Success, exit retry loop
-            except httpx.TimeoutException:
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(1)
-                    continue
-                else:
-                    raise HTTPException(status_code=504, detail="Request timeout - API proxy is slow")
-            except httpx.RequestError as e:
-                raise HTTPException(status_code=500, detail=str(e))
+    for attempt in range(max_retries):
+        try:
+            timeout = 15 + (attempt * 10)  # 15s, 25s, 35s
+            response = await client.get(url, timeout=float(timeout))
+            if response.status_code in FETCH_RETRY_STATUSES and attempt < max_retries - 1:
+                await asyncio.sleep(get_retry_delay(response, attempt))
+                continue
+            break  # Done, exit retry loop
+        except httpx.TimeoutException:
+            if attempt < max_retries - 1:
+                await asyncio.sleep(1)
+                continue
+            else:
+                raise HTTPException(status_code=504, detail="Request timeout - API proxy is slow")
+        except httpx.RequestError as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Track tournament search event (server-side)
-            await capture_event("tournament_searched", properties={
-                "tournament_tag": data.get("tag", ""),
-                "tournament_name": data.get("name", ""),
-                "player_count": len(data.get("membersList", [])),
-            })
-            
-            return {
-                "tag": data.get("tag", ""),
-                "name": data.get("name", "Unknown"),
-                "status": data.get("status", "unknown"),
-                "capacity": data.get("capacity", 0),
-                "maxCapacity": data.get("maxCapacity", 1000),
-                "membersList": len(data.get("membersList", [])),
-            }
-        elif response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Tournament not found")
-        elif response.status_code == 403:
-            raise HTTPException(status_code=403, detail="API access forbidden. Check your API key has IP 45.79.218.79 whitelisted.")
-        else:
-            raise HTTPException(status_code=response.status_code, detail=f"API error: {response.status_code}")
+    if response.status_code == 200:
+        data = orjson.loads(response.content)
+
+        # Track tournament search event (server-side)
+        capture_event("tournament_searched", properties={
+            "tournament_tag": data.get("tag", ""),
+            "tournament_name": data.get("name", ""),
+            "player_count": len(data.get("membersList", [])),
+        })
+        if POSTHOG_FLUSH_PER_REQUEST:
+            background_tasks.add_task(flush_posthog_queue, getattr(app.state, "posthog_queue", None))
+
+        return ORJSONResponse({
+            "tag": data.get("tag", ""),
+            "name": data.get("name", "Unknown"),
+            "status": data.get("status", "unknown"),
+            "capacity": data.get("capacity", 0),
+            "maxCapacity": data.get("maxCapacity", 1000),
+            "membersList": len(data.get("membersList", [])),
+        })
+    elif response.status_code == 404:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    elif response.status_code == 403:
+        raise HTTPException(status_code=403, detail="API access forbidden. Check your API key has IP 45.79.218.79 whitelisted.")
+    else:
+        raise HTTPException(status_code=response.status_code, detail=f"API error: {response.status_code}")
 
 
 @app.get("/api/player/{tag:path}/classify")
-async def classify_player_endpoint(tag: str, response: Response):
+async def classify_player_endpoint(tag: str, client: httpx.AsyncClient = Depends(get_client)):
     """
     Fetch player profile and return their classification.
     Cached for 12 hours at Vercel's edge.
@@ -1169,31 +1730,34 @@ async def classify_player_endpoint(tag: str, response: Response):
     if not tag.startswith("#"):
         tag = "#" + tag
 
-    encoded_tag = quote(tag, safe="")
-    
-    async with httpx.AsyncClient() as client:
+    # Recently fetched players (e.g. by an analysis) need no upstream call
+    player_data = player_memory_cache.get(tag)
+    if player_data is None:
+        encoded_tag = encode_tag(tag)
         try:
             api_response = await client.get(
-                f"{CR_API_BASE}/players/{encoded_tag}",
-                headers=get_headers(),
+                f"/players/{encoded_tag}",
                 timeout=10.0
             )
             if api_response.status_code != 200:
                 raise HTTPException(status_code=api_response.status_code, detail=f"API error: {api_response.status_code}")
-            
-            player_data = api_response.json()
+
+            player_data = project_player(orjson.loads(api_response.content))
         except httpx.RequestError as e:
             raise HTTPException(status_code=500, detail=str(e))
+        player_memory_cache[tag] = player_data
 
     # Classify the player
     classification = classify_player(player_data)
     
     # Set Vercel edge cache headers
-    response.headers["Cache-Control"] = f"public, s-maxage={PLAYER_CACHE_DURATION}, stale-while-revalidate={PLAYER_CACHE_STALE}"
-    response.headers["CDN-Cache-Control"] = f"public, max-age={PLAYER_CACHE_DURATION}"
-    response.headers["Vercel-CDN-Cache-Control"] = f"public, max-age={PLAYER_CACHE_DURATION}"
-    
-    return {
+    cache_headers = {
+        "Cache-Control": f"public, s-maxage={PLAYER_CACHE_DURATION}, stale-while-revalidate={PLAYER_CACHE_STALE}",
+        "CDN-Cache-Control": f"public, max-age={PLAYER_CACHE_DURATION}",
+        "Vercel-CDN-Cache-Control": f"public, max-age={PLAYER_CACHE_DURATION}",
+    }
+
+    return ORJSONResponse({
         "tag": player_data.get("tag"),
         "name": player_data.get("name"),
         "trophies": player_data.get("trophies"),
@@ -1204,11 +1768,11 @@ async def classify_player_endpoint(tag: str, response: Response):
             "best": player_data.get("bestPathOfLegendSeasonResult"),
         },
         "_cachedAt": datetime.now().isoformat()
-    }
+    }, headers=cache_headers)
 
 
 @app.get("/api/player/{tag:path}")
-async def get_player(tag: str, response: Response):
+async def get_player(tag: str, client: httpx.AsyncClient = Depends(get_client)):
     """
     Get player profile with Vercel edge caching.
     Cached for 12 hours, serves stale while revalidating for up to 24 hours.
@@ -1219,35 +1783,42 @@ async def get_player(tag: str, response: Response):
     if not tag.startswith("#"):
         tag = "#" + tag
 
-    encoded_tag = quote(tag, safe="")
+    # Set Vercel edge cache headers (12 hours cache, 24 hours stale-while-revalidate)
+    cache_headers = {
+        "Cache-Control": f"public, s-maxage={PLAYER_CACHE_DURATION}, stale-while-revalidate={PLAYER_CACHE_STALE}",
+        "CDN-Cache-Control": f"public, max-age={PLAYER_CACHE_DURATION}",
+        "Vercel-CDN-Cache-Control": f"public, max-age={PLAYER_CACHE_DURATION}",
+    }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            api_response = await client.get(
-                f"{CR_API_BASE}/players/{encoded_tag}",
-                headers=get_headers(),
-                timeout=10.0
-            )
+    # The profile is encoded once and served as bytes, so neither cache hits
+    # nor fresh fetches go through FastAPI's jsonable_encoder
+    body = player_profile_cache.get(tag)
+    if body is not None:
+        return Response(content=body, media_type="application/json", headers=cache_headers)
 
-            if api_response.status_code == 200:
-                data = api_response.json()
-                data["_cachedAt"] = datetime.now().isoformat()
-                
-                # Set Vercel edge cache headers (12 hours cache, 24 hours stale-while-revalidate)
-                response.headers["Cache-Control"] = f"public, s-maxage={PLAYER_CACHE_DURATION}, stale-while-revalidate={PLAYER_CACHE_STALE}"
-                response.headers["CDN-Cache-Control"] = f"public, max-age={PLAYER_CACHE_DURATION}"
-                response.headers["Vercel-CDN-Cache-Control"] = f"public, max-age={PLAYER_CACHE_DURATION}"
-                
-                return data
-            elif api_response.status_code == 404:
-                raise HTTPException(status_code=404, detail="Player not found")
-            else:
-                raise HTTPException(status_code=api_response.status_code, detail=f"API error: {api_response.status_code}")
+    encoded_tag = encode_tag(tag)
 
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="Request timeout")
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        api_response = await client.get(
+            f"/players/{encoded_tag}",
+            timeout=10.0
+        )
+
+        if api_response.status_code == 200:
+            data = orjson.loads(api_response.content)
+            data["_cachedAt"] = datetime.now().isoformat()
+            player_memory_cache[tag] = project_player(data)
+            body = player_profile_cache[tag] = orjson.dumps(data)
+            return Response(content=body, media_type="application/json", headers=cache_headers)
+        elif api_response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Player not found")
+        else:
+            raise HTTPException(status_code=api_response.status_code, detail=f"API error: {api_response.status_code}")
+
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="Request timeout")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/tournaments/recent")
@@ -1286,7 +1857,7 @@ async def cache_stats():
     # Try to get some cache info from KV
     if KV_ENABLED:
         try:
-            info = kv.dbsize()
+            info = await kv.dbsize()
             stats["kv_cache"]["total_keys"] = info
         except:
             pass
@@ -1294,11 +1865,32 @@ async def cache_stats():
     return stats
 
 
+# Optional shared secret for wiping the KV player cache. Unset keeps the
+# endpoint open; set, callers must send it as the X-Admin-Token header.
+CACHE_CLEAR_TOKEN = os.getenv("CACHE_CLEAR_TOKEN", "")
+
+
 @app.post("/api/cache/clear")
-async def clear_cache():
-    """Clear the player cache (Vercel edge cache cannot be cleared via API)."""
+async def clear_cache(x_admin_token: str | None = Header(default=None)):
+    """
+    Clear the KV player cache (Vercel edge cache cannot be cleared via API).
+    Requires the X-Admin-Token header when CACHE_CLEAR_TOKEN is set.
+    """
+    if CACHE_CLEAR_TOKEN and not secrets.compare_digest(x_admin_token or "", CACHE_CLEAR_TOKEN):
+        raise HTTPException(status_code=403, detail="Clearing the cache requires a valid X-Admin-Token")
+
+    edge_message = "Vercel edge cache automatically expires after 12 hours."
+    if not KV_ENABLED:
+        return {
+            "message": f"KV cache not configured. {edge_message}",
+            "deleted": 0,
+            "cache_duration_hours": PLAYER_CACHE_DURATION / 3600
+        }
+
+    deleted = await clear_cached_players()
     return {
-        "message": "Vercel edge cache automatically expires after 12 hours. To force refresh a specific player, wait for cache expiry or redeploy.",
+        "message": f"Cleared {deleted} cached players from KV. {edge_message}",
+        "deleted": deleted,
         "cache_duration_hours": PLAYER_CACHE_DURATION / 3600
     }
 
@@ -1307,65 +1899,149 @@ async def clear_cache():
 # Static file serving (for local development only)
 # On Vercel, static files are served directly from the root folder
 # ============================================================
-import os
-import pathlib
-from fastapi.responses import HTMLResponse, FileResponse
 
 # Only enable static file serving when running locally (not on Vercel)
 if not os.environ.get("VERCEL"):
     PUBLIC_DIR = pathlib.Path(__file__).parent.parent / "public"
 
-    @app.get("/", response_class=HTMLResponse)
-    async def serve_homepage():
-        index_path = PUBLIC_DIR / "index.html"
-        if index_path.exists():
-            return HTMLResponse(content=index_path.read_text())
-        raise HTTPException(status_code=404, detail="index.html not found")
-
-    @app.get("/dashboard.html", response_class=HTMLResponse)
-    async def serve_dashboard():
-        dashboard_path = PUBLIC_DIR / "dashboard.html"
-        if dashboard_path.exists():
-            return HTMLResponse(content=dashboard_path.read_text())
-        raise HTTPException(status_code=404, detail="dashboard.html not found")
-
-    @app.get("/public.css")
-    async def serve_public_css():
-        css_path = PUBLIC_DIR / "public.css"
-        if css_path.exists():
-            return FileResponse(css_path, media_type="text/css")
-        raise HTTPException(status_code=404, detail="public.css not found")
-
-    @app.get("/public.js")
-    async def serve_public_js():
-        js_path = PUBLIC_DIR / "public.js"
-        if js_path.exists():
-            return FileResponse(js_path, media_type="application/javascript")
-        raise HTTPException(status_code=404, detail="public.js not found")
-
-    @app.get("/style.css")
-    async def serve_style_css():
-        css_path = PUBLIC_DIR / "style.css"
-        if css_path.exists():
-            return FileResponse(css_path, media_type="text/css")
-        raise HTTPException(status_code=404, detail="style.css not found")
-
-    @app.get("/script.js")
-    async def serve_script_js():
-        js_path = PUBLIC_DIR / "script.js"
-        if js_path.exists():
-            return FileResponse(js_path, media_type="application/javascript")
-        raise HTTPException(status_code=404, detail="script.js not found")
-
-    @app.get("/assets/{path:path}")
-    async def serve_assets(path: str):
-        asset_path = PUBLIC_DIR / "assets" / path
-        if asset_path.exists() and asset_path.is_file():
-            suffix = asset_path.suffix.lower()
-            content_types = {
-                ".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
-                ".gif": "image/gif", ".svg": "image/svg+xml", ".ico": "image/x-icon",
-                ".woff": "font/woff", ".woff2": "font/woff2", ".ttf": "font/ttf", ".otf": "font/otf",
-            }
-            return FileResponse(asset_path, media_type=content_types.get(suffix, "application/octet-stream"))
-        raise HTTPException(status_code=404, detail=f"Asset not found: {path}")
\ No newline at end of file
+    # route -> (file in PUBLIC_DIR, media type)
+    STATIC_FILES = {
+        "/": ("index.html", "text/html; charset=utf-8"),
+        "/dashboard.html": ("dashboard.html", "text/html; charset=utf-8"),
+        "/public.css": ("public.css", "text/css"),
+        "/public.js": ("public.js", "application/javascript"),
+        "/style.css": ("style.css", "text/css"),
+        "/script.js": ("script.js", "application/javascript"),
+    }
+
+    def static_not_found(detail: str) -> Response:
+        """
+        Same body as HTTPException(404), returned instead of raised so missing
+        files skip the exception handler. Built per call: middleware appends
+        to a response's headers, so a shared instance would accumulate them.
+        """
+        return ORJSONResponse({"detail": detail}, status_code=404)
+
+    # Brotli is optional (not in requirements.txt); gzip is always available
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    def precompress(content: bytes) -> list[tuple[str, bytes]]:
+        """(Content-Encoding, body) variants smaller than the original, best first."""
+        variants = []
+        if brotli is not None:
+            variants.append(("br", brotli.compress(content, quality=11)))
+        variants.append(("gzip", gzip.compress(content, compresslevel=9)))
+        return [(coding, body) for coding, body in variants if len(body) < len(content)]
+
+    # Read every file once at startup; handlers answer from memory (no stat()
+    # calls per request), and are async so they skip the threadpool hop.
+    # The content hash doubles as the ETag, so reloads revalidate with a 304.
+    # Compressed once here at max level, so GZipMiddleware has nothing to do.
+    STATIC_CACHE = {}
+    for route, (filename, media_type) in STATIC_FILES.items():
+        file_path = PUBLIC_DIR / filename
+        if file_path.is_file():
+            content = file_path.read_bytes()
+            etag = f'W/"{hashlib.blake2b(content, digest_size=8).hexdigest()}"'
+            STATIC_CACHE[route] = (content, media_type, etag, precompress(content))
+
+    async def serve_static(request: Request) -> Response:
+        """One handler for every STATIC_FILES route; the matched route is the cache key."""
+        route = request.scope["route"].path
+        if route not in STATIC_CACHE:
+            return static_not_found(f"{STATIC_FILES[route][0]} not found")
+        content, media_type, etag, encoded = STATIC_CACHE[route]
+        # Not fingerprinted and edited between restarts, so always revalidate
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(etag, request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        # Highest q wins, ties keep our best-first order; q=0 means refused
+        qvalues = encoding_qvalues(request.headers.get("accept-encoding"))
+        accepted = [(coding, body) for coding, body in encoded if encoding_q(qvalues, coding) > 0]
+        if accepted:
+            coding, body = max(accepted, key=lambda variant: encoding_q(qvalues, variant[0]))
+            headers["Content-Encoding"] = coding
+            headers["Vary"] = "Accept-Encoding"
+            return Response(content=body, media_type=media_type, headers=headers)
+        return Response(content=content, media_type=media_type, headers=headers)
+
+    # HEAD shares the handler: the body is already in memory and the server
+    # drops it, so there is nothing to skip
+    for route in STATIC_FILES:
+        app.add_api_route(route, serve_static, methods=["GET", "HEAD"])
+
+    # Scan the asset tree once (relative path -> file, stat, media type,
+    # validators) so lookups, 404s and path traversal attempts never touch the
+    # disk before a file is sent, and nothing is re-resolved per request.
+    # The validators use FileResponse's formula, so both send the same ones.
+    def asset_validators(stat_result: os.stat_result) -> dict:
+        etag_base = f"{stat_result.st_mtime}-{stat_result.st_size}"
+        return {
+            "ETag": f'"{hashlib.md5(etag_base.encode(), usedforsecurity=False).hexdigest()}"',
+            "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+            # Not fingerprinted, so always revalidate
+            "Cache-Control": "no-cache",
+        }
+
+    ASSETS_DIR = PUBLIC_DIR / "assets"
+    ASSET_FILES = {}
+    for path in ASSETS_DIR.rglob("*"):
+        if path.is_file():
+            stat_result = path.stat()
+            ASSET_FILES[path.relative_to(ASSETS_DIR).as_posix()] = (
+                path,
+                stat_result,
+                mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+                asset_validators(stat_result),
+            )
+
+    def asset_not_modified(validators: dict, request: Request) -> bool:
+        """StaticFiles' rule: If-None-Match wins, else compare If-Modified-Since."""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            return etag_matches(validators["ETag"], if_none_match)
+        if_modified_since = parsedate(request.headers.get("if-modified-since", ""))
+        return if_modified_since is not None and if_modified_since >= parsedate(validators["Last-Modified"])
+
+    # Behind nginx, set this to an `internal` location aliasing public/assets/
+    # (e.g. /_assets/) and the proxy sends the file instead of Python
+    ASSETS_ACCEL_REDIRECT = os.getenv("ASSETS_ACCEL_REDIRECT", "")
+
+    @app.api_route("/assets/{path:path}", methods=["GET", "HEAD"])
+    async def serve_asset(path: str, request: Request):
+        entry = ASSET_FILES.get(path)
+        if entry is None:
+            return static_not_found(f"Asset not found: {path}")
+        file_path, stat_result, media_type, validators = entry
+        if asset_not_modified(validators, request):
+            return Response(status_code=304, headers=validators)
+        if ASSETS_ACCEL_REDIRECT:
+            # nginx keeps these upstream headers on the file it sends
+            headers = {**validators, "X-Accel-Redirect": ASSETS_ACCEL_REDIRECT + path}
+            return Response(headers=headers, media_type=media_type)
+        return FileResponse(file_path, media_type=media_type, stat_result=stat_result, headers=validators)
+
+# ============================================================
+# Self-hosted entry point (python -m api.index)
+# On Vercel every invocation already runs in its own process
+# ============================================================
+if __name__ == "__main__":
+    import uvicorn
+
+    # One event loop per worker process, so a large tournament analysis
+    # doesn't stall unrelated requests. Shared state (player and tournament
+    # results, locks, progress) lives in Upstash KV, but player_memory_cache,
+    # player_profile_cache and the in-flight fetch dedup are per process:
+    # N workers means N cold in-process caches, each fetching on its own.
+    uvicorn.run(
+        "api.index:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8080")),
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        proxy_headers=True,
+    )
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# api/index.py reads its config at import time; a dummy key keeps the
+# API-key checks out of the way, nothing here talks to the network
+os.environ.setdefault("CR_API_KEY", "test-key")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,146 @@
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import index
+
+
+def pol(rank=None, trophies=None):
+    return {"rank": rank, "trophies": trophies}
+
+
+# One player per tier boundary, plus the shapes the API actually returns
+# (missing keys, empty season results, rank without trophies...)
+EDGE_PLAYERS = [
+    {"name": "a", "trophies": 9000, "currentPathOfLegendSeasonResult": pol(1, 3000)},
+    {"name": "b", "trophies": 9000, "lastPathOfLegendSeasonResult": pol(1000)},
+    {"name": "c", "trophies": 9000, "bestPathOfLegendSeasonResult": pol(1001, 0)},
+    {"name": "d", "trophies": 9000, "currentPathOfLegendSeasonResult": pol(10000)},
+    {"name": "e", "trophies": 9000, "currentPathOfLegendSeasonResult": pol(50000)},
+    {"name": "f", "trophies": 9000, "currentPathOfLegendSeasonResult": pol(50001)},
+    {"name": "g", "trophies": 9000, "currentPathOfLegendSeasonResult": pol(70000), "bestPathOfLegendSeasonResult": pol(42)},
+    {"name": "h", "trophies": 9000, "lastPathOfLegendSeasonResult": pol(None, 12)},
+    {"name": "i", "trophies": 13000, "currentPathOfLegendSeasonResult": pol(None, 0)},
+    {"name": "j", "trophies": 12000},
+    {"name": "k", "trophies": 11999},
+    {"name": "l", "trophies": 10000},
+    {"name": "m", "trophies": 9999},
+    {"name": "n", "trophies": 8000},
+    {"name": "o", "trophies": 7999},
+    {"name": "p", "currentPathOfLegendSeasonResult": {}},
+    {"name": "q", "trophies": 0, "lastPathOfLegendSeasonResult": None},
+]
+
+
+def random_player(rng):
+    player = {"name": "r", "trophies": rng.randrange(0, 15000)}
+    for key in index.POL_KEYS:
+        roll = rng.random()
+        if roll < 0.2:
+            player[key] = pol(rng.randrange(1, 100000), rng.randrange(0, 4000))
+        elif roll < 0.3:
+            player[key] = pol(None, rng.choice((0, rng.randrange(1, 4000))))
+    return player
+
+
+@pytest.mark.parametrize("player_data", EDGE_PLAYERS)
+def test_pack_unpack_round_trip_keeps_classification(player_data):
+    entry = index.pack_cached_player(player_data, 1700000000)
+    assert entry["s"] == 1700000000
+    unpacked = index.unpack_cached_player(entry)
+    assert unpacked["name"] == player_data["name"]
+    assert index.classify_player(unpacked) == index.classify_player(player_data)
+
+
+def test_classify_player_tiers():
+    tiers = [index.classify_player(p)["tier"] for p in EDGE_PLAYERS]
+    assert tiers == [
+        "top_1k", "top_1k", "top_10k", "top_10k", "top_50k", "ever_ranked", "top_1k",
+        "final_league", "reached_12k", "reached_12k", "trophy_10k_12k", "trophy_10k_12k",
+        "casual", "casual", "beginner", "beginner", "beginner",
+    ]
+
+
+@pytest.mark.parametrize("size", [len(EDGE_PLAYERS), index.BATCH_CLASSIFY_MIN - 1, index.BATCH_CLASSIFY_MIN, 3000])
+def test_classify_players_matches_classify_player(size):
+    rng = random.Random(size)
+    players = (EDGE_PLAYERS * (size // len(EDGE_PLAYERS) + 1))[:size]
+    players = [p if i < len(EDGE_PLAYERS) else random_player(rng) for i, p in enumerate(players)]
+    assert index.classify_players(players) == [index.classify_player(p) for p in players]
+
+
+def test_classify_players_empty():
+    assert index.classify_players([]) == []
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    (' * ', True),
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('W/"ABC"', False),
+    ('W/"abcd"', False),
+    ('W/"xyz", W/"abc"', True),
+    ('W/"xyz",W/"abc" ', True),
+    ('W/"xyz"', False),
+])
+def test_etag_matches(if_none_match, expected):
+    assert index.etag_matches('W/"abc"', if_none_match) is expected
+
+
+def test_build_summary_percentages():
+    tier_counts = index._new_tier_counts()
+    tier_counts["top_1k"] = 1
+    tier_counts["casual"] = 2
+    summary = index._build_summary(tier_counts, 3)
+    assert list(summary) == list(index.TIER_ORDER)
+    assert summary["top_1k"] == {"count": 1, "percent": 33.3}
+    assert summary["casual"] == {"count": 2, "percent": 66.7}
+    assert summary["beginner"] == {"count": 0, "percent": 0.0}
+    assert all(isinstance(tier["percent"], float) for tier in summary.values())
+
+
+def test_build_summary_no_players():
+    summary = index._build_summary(index._new_tier_counts(), 0)
+    assert summary == {tier: {"count": 0, "percent": 0} for tier in index.TIER_ORDER}
+
+
+def test_etag_matches_strong_etag_against_weak_tag():
+    assert index.etag_matches('"abc"', 'W/"abc"')
+
+
+def test_encoding_qvalues():
+    assert index.encoding_qvalues("gzip;q=0, BR ; q=0.5, deflate, x;q=oops") == {
+        "gzip": 0.0, "br": 0.5, "deflate": 1.0, "x": 0.0,
+    }
+    assert index.encoding_qvalues(None) == {}
+    assert index.encoding_q({"*": 0.3}, "br") == 0.3
+    assert index.encoding_q({"gzip": 1.0}, "br") == 0.0
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(index.app)
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("br;q=0, gzip;q=0", None),
+    ("br;q=0, *", "gzip"),
+    ("*;q=0", None),
+])
+def test_static_content_negotiation(client, accept_encoding, expected):
+    if expected == "br" and index.brotli is None:
+        expected = "gzip"  # No br variant without the optional brotli package
+    response = client.get("/style.css", headers={"Accept-Encoding": accept_encoding})
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == expected
+    assert response.content == (index.PUBLIC_DIR / "style.css").read_bytes()